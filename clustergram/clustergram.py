@@ -5,11 +5,32 @@ Original idea is by Matthias Schonlau - http://www.schonlau.net/clustergram.html
 """
 
 import contextlib
+import hashlib
+import logging
+import sys
+import warnings
 from collections import defaultdict
+from functools import lru_cache, partial
 from time import time
 
+import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.colors import to_rgba
+from matplotlib.ticker import MaxNLocator
+
+try:
+    from numba import get_num_threads, njit, prange
+
+    HAS_NUMBA = True
+except (ModuleNotFoundError, ImportError):
+    HAS_NUMBA = False
+
+logger = logging.getLogger("clustergram")
+
+# options consumed by Clustergram itself and not passed to the models
+_CLUSTERGRAM_KWARGS = ["bic", "cachedir", "dtype", "fast_sweep", "n_jobs", "warm_start"]
 
 
 class Clustergram:
@@ -36,7 +57,8 @@ class Clustergram:
         components). Not required for hierarchical clustering but will be applied
         if given. It is recommended to always use limited range for hierarchical
         methods as unlimited clustergram can take a while to compute and for large
-        number of observations is not legible.
+        number of observations is not legible. Values larger than the number of
+        observations are skipped on ``fit``.
     backend : {'sklearn', 'cuML', 'scipy'} (default None)
         Specify computational backend. Defaults to ``sklearn`` for ``'kmeans'``,
         ``'gmm'``, and ``'minibatchkmeans'`` methods and to ``'scipy'`` for any of
@@ -49,21 +71,42 @@ class Clustergram:
         * ``kmeans`` uses K-Means clustering, either as ``sklearn.cluster.KMeans``
           or ``cuml.KMeans``.
         * ``gmm`` uses Gaussian Mixture Model as ``sklearn.mixture.GaussianMixture``
+          or ``cuml.mixture.GaussianMixture`` if available. With ``cuML`` backend,
+          cluster centers and labels are always computed on GPU.
         * ``minibatchkmeans`` uses Mini Batch K-Means as
           ``sklearn.cluster.MiniBatchKMeans``
         * ``hierarchical`` uses hierarchical/agglomerative clustering as
           ``scipy.cluster.hierarchy.linkage``. See
 
-        Note that ``gmm`` and ``minibatchkmeans`` are currently supported only
-        with ``sklearn`` backend.
+        Note that ``minibatchkmeans`` is currently supported only with ``sklearn``
+        backend.
     verbose : bool (default True)
-        Print progress and time of individual steps.
+        Print progress and time of individual steps. Messages are emitted via the
+        ``clustergram`` logger, whose level is lowered to ``INFO`` only for the
+        duration of ``fit``.
     **kwargs
         Additional arguments passed to the model (e.g. ``KMeans``),
         e.g. ``random_state``. Pass ``linkage`` to specify linkage method in
         case of hierarchical clustering (e.g. ``linkage='ward'``). See the
         documentation of scipy for details. If ``method='gmm'``, you can pass
         ``bic=True`` to store BIC value in ``Clustergram.bic``.
+        For ``kmeans``, ``minibatchkmeans`` and ``gmm`` methods, individual ``k``
+        are fitted in parallel using ``joblib``. Pass ``n_jobs`` to control the
+        number of workers (default ``-1`` uses all available cores). The same
+        number of threads is used to count branches when plotting.
+        Pass ``cachedir`` to cache fitted models on disk using ``joblib.Memory``,
+        keyed by the content of data, ``k`` and the model parameters. Subsequent
+        fits of the same data then load labels and cluster centers from the cache.
+        With ``sklearn`` and ``scipy`` backends, data are converted to a C-contiguous
+        array once and shared by all the models, PCA and scores. Pass
+        ``dtype='float32'`` to halve its memory footprint (default ``'float64'``).
+        Pass ``fast_sweep=True`` to approximate ``k`` smaller than a half of the
+        maximum of ``k_range`` with ``MiniBatchKMeans`` (with ``batch_size`` of at
+        most 4096) when using ``kmeans`` method.
+        Pass ``warm_start=True`` to initialise each ``k`` from the cluster centers
+        of the previous one plus new k-means++ seeds instead. That reduces the
+        number of iterations needed to converge but runs sequentially. Ignored if
+        ``init`` is specified.
 
     Attributes
     ----------
@@ -112,11 +155,13 @@ class Clustergram:
         **kwargs,
     ):
         self.k_range = k_range
+        self._requested_k_range = k_range
         self.backend = backend
         self.method = method
         self.verbose = verbose
         self.kwargs = kwargs
         self._backend = backend
+        self._plot_pair_cache = {}
 
     def __repr__(self):
         return (
@@ -162,11 +207,13 @@ class Clustergram:
         else:
             self._backend = self.backend
 
+        # the range requested by the caller is filtered anew on every fit
+        self.k_range = self._requested_k_range
         if self.k_range is None and self.method != "hierarchical":
             raise ValueError(f"'k_range' is mandatory for '{self.method}' method.")
 
         if (
-            (self._backend == "cuML" and self.method != "kmeans")
+            (self._backend == "cuML" and self.method not in ["kmeans", "gmm"])
             or (self._backend == "scipy" and self.method != "hierarchical")
             or (self._backend == "sklearn" and self.method == "hierarchical")
         ):
@@ -184,6 +231,9 @@ class Clustergram:
             )
 
         self.store_bic = self.kwargs.get("bic", False)
+        self._clean_kwargs = {
+            k: v for k, v in self.kwargs.items() if k not in _CLUSTERGRAM_KWARGS
+        }
 
         if self._backend in ["sklearn", "scipy"]:
             self.plot_data = pd.DataFrame()
@@ -202,58 +252,135 @@ class Clustergram:
 
         self._n_pca = 0
         self._link_pca = defaultdict(dict)
+        self._plot_pair_cache = {}
+        self._plot_data_range = None
+        self._plot_data_range_pca = {}
+
+        if self.k_range is not None and max(self.k_range) > len(X):
+            k_range = [k for k in self.k_range if k <= len(X)]
+            if not k_range:
+                raise ValueError(
+                    f"All values of 'k_range' are larger than the number of "
+                    f"observations ({len(X)})."
+                )
+            warnings.warn(
+                f"'k_range' contains values larger than the number of observations "
+                f"({len(X)}). These are skipped.",
+                UserWarning,
+                stacklevel=2,
+            )
+            self.k_range = k_range
 
         self.data = X
-        if self._backend == "sklearn":
-            if self.method == "kmeans":
-                self._kmeans_sklearn(X, minibatch=False, **kwargs)
-            elif self.method == "minibatchkmeans":
-                self._kmeans_sklearn(X, minibatch=True, **kwargs)
-            elif self.method == "gmm":
-                self._gmm_sklearn(X, **kwargs)
-        if self._backend == "cuML":
-            self._kmeans_cuml(X, **kwargs)
-        if self._backend == "scipy":
-            self._scipy_hierarchical(X, **kwargs)
+        if self._backend in ["sklearn", "scipy"]:
+            # single conversion shared by all the models, metrics and PCA
+            X = self._X_internal = np.ascontiguousarray(  # noqa: N806
+                X.values if isinstance(X, pd.DataFrame) else X,
+                dtype=self.kwargs.get("dtype", "float64"),
+            )
+
+        if self.method in ["kmeans", "minibatchkmeans"]:
+            # used as the cluster center of k=1 and as the seed of warm start
+            self._global_mean = (
+                np.asarray(X.mean(axis=0))
+                if self._backend == "sklearn"
+                else X.mean(axis=0)
+            )
+
+        with _verbosity(self.verbose):
+            if self._backend == "sklearn":
+                if self.method == "kmeans":
+                    self._kmeans_sklearn(X, minibatch=False, **kwargs)
+                elif self.method == "minibatchkmeans":
+                    self._kmeans_sklearn(X, minibatch=True, **kwargs)
+                elif self.method == "gmm":
+                    self._gmm_sklearn(X, **kwargs)
+            if self._backend == "cuML":
+                if self.method == "kmeans":
+                    self._kmeans_cuml(X, **kwargs)
+                elif self.method == "gmm":
+                    self._gmm_cuml(X, **kwargs)
+            if self._backend == "scipy":
+                self._scipy_hierarchical(X, **kwargs)
 
         return self
 
     def _kmeans_sklearn(self, data, minibatch, **kwargs):
         """Use scikit-learn KMeans."""
         try:
-            from sklearn.cluster import KMeans, MiniBatchKMeans
+            import sklearn.cluster  # noqa: F401
+            from joblib import Memory, Parallel, delayed
         except ImportError as e:
             raise ImportError(
                 "scikit-learn is required to use `sklearn` backend."
             ) from e
 
-        self.labels = pd.DataFrame()
+        n_jobs = self.kwargs.get("n_jobs", -1)
+        warm_start = self.kwargs.get("warm_start", False)
+        cachedir = self.kwargs.get("cachedir", None)
+        fast_sweep = self.kwargs.get("fast_sweep", False)
+
+        labels_arr = np.empty((len(data), len(self.k_range)), dtype=np.int32)
         self.cluster_centers = {}
 
-        for n in self.k_range:
+        fit_one_k = _fit_one_k
+        if cachedir is not None:
+            cached = Memory(location=cachedir, verbose=0).cache(
+                _cached_fit_one_k, ignore=["data"]
+            )
+            fit_one_k = partial(cached, _hash_data(data))
+        if fast_sweep and not minibatch:
+            fit_one_k = partial(
+                _fit_fast_sweep,
+                fit_one_k,
+                max(self.k_range) / 2,
+                min(4096, len(data)),
+            )
+
+        if warm_start and "init" not in self._clean_kwargs:
+            results = _fit_warm_started(
+                fit_one_k,
+                self.k_range,
+                data,
+                self._clean_kwargs,
+                minibatch,
+                kwargs,
+                self._global_mean if 1 in self.k_range else None,
+            )
+        else:
+            results = Parallel(n_jobs=n_jobs, backend="loky")(
+                delayed(fit_one_k)(n, data, self._clean_kwargs, minibatch, kwargs)
+                for n in self.k_range
+                if 1 < n < len(data)
+            )
+        fitted = {
+            n: (labels, centers, elapsed) for n, labels, centers, elapsed in results
+        }
+
+        for idx, n in enumerate(self.k_range):
             if n == 1:
-                self.labels[n] = [0] * len(data)
-                self.cluster_centers[n] = np.array([data.mean(axis=0)])
+                labels_arr[:, idx], self.cluster_centers[n] = self._k1_result(data)
 
-                print(
-                    f"K={n} skipped. Mean computed from data directly."
-                ) if self.verbose else None
+                logger.info("K=%d skipped. Mean computed from data directly.", n)
 
                 continue
 
-            s = time()
-            results = (
-                MiniBatchKMeans(n_clusters=n, **self.kwargs).fit(data, **kwargs)
-                if minibatch
-                else KMeans(n_clusters=n, **self.kwargs).fit(data, **kwargs)
-            )
+            if n == len(data):
+                labels_arr[:, idx], self.cluster_centers[n] = self._identity_result(
+                    data
+                )
 
-            self.labels[n] = results.labels_
-            self.cluster_centers[n] = results.cluster_centers_
+                logger.info("K=%d skipped. Each observation is its own cluster.", n)
+
+                continue
 
-            print(
-                f"K={n} fitted in {(time() - s):.3f} seconds."
-            ) if self.verbose else None
+            labels, centers, elapsed = fitted[n]
+            labels_arr[:, idx] = labels
+            self.cluster_centers[n] = centers
+
+            logger.info("K=%d fitted in %.3f seconds.", n, elapsed)
+
+        self.labels = pd.DataFrame(labels_arr, columns=list(self.k_range), copy=False)
 
     def _kmeans_cuml(self, data, **kwargs):
         """Use cuML KMeans."""
@@ -266,79 +393,165 @@ class Clustergram:
                 "cuML, cuDF and cupy packages are required to use `cuML` backend."
             ) from e
 
-        self.labels = cudf.DataFrame()
+        labels_arr = cp.empty((len(data), len(self.k_range)), dtype=cp.int32)
         self.cluster_centers = {}
 
-        for n in self.k_range:
+        for idx, n in enumerate(self.k_range):
             if n == 1:
-                self.labels[n] = [0] * len(data)
-                if isinstance(data, cudf.DataFrame):
-                    self.cluster_centers[n] = cudf.DataFrame(data.mean(axis=0)).T
-                elif isinstance(data, cp.ndarray):
-                    self.cluster_centers[n] = cp.array([data.mean(axis=0)])
-                else:
-                    self.cluster_centers[n] = np.array([data.mean(axis=0)])
+                labels_arr[:, idx], self.cluster_centers[n] = self._k1_result(data)
 
-                print(
-                    f"K={n} skipped. Mean computed from data directly."
-                ) if self.verbose else None
+                logger.info("K=%d skipped. Mean computed from data directly.", n)
+
+                continue
+
+            if n == len(data):
+                labels_arr[:, idx], self.cluster_centers[n] = self._identity_result(
+                    data
+                )
+
+                logger.info("K=%d skipped. Each observation is its own cluster.", n)
 
                 continue
 
             s = time()
-            results = KMeans(n_clusters=n, **self.kwargs).fit(data, **kwargs)
-            self.labels[n] = results.labels_
+            results = KMeans(n_clusters=n, **self._clean_kwargs).fit(data, **kwargs)
+            labels_arr[:, idx] = cp.asarray(results.labels_)
             self.cluster_centers[n] = results.cluster_centers_
 
-            print(
-                f"K={n} fitted in {(time() - s):.3f} seconds."
-            ) if self.verbose else None
+            logger.info("K=%d fitted in %.3f seconds.", n, time() - s)
+
+        self.labels = cudf.DataFrame(labels_arr, columns=list(self.k_range))
+
+    def _k1_result(self, data):
+        """Labels and cluster centers of ``k=1``, where all observations form a
+        single cluster centered at the mean of data."""
+        if self._backend == "cuML":
+            import cudf
+            import cupy as cp
+
+            if isinstance(data, cudf.DataFrame):
+                centers = cudf.DataFrame(self._global_mean).T
+            elif isinstance(data, cp.ndarray):
+                centers = cp.array([self._global_mean])
+            else:
+                centers = np.asarray([self._global_mean])
+
+            return cp.zeros(len(data), dtype=cp.int32), centers
+
+        return np.zeros(len(data), dtype=np.int32), np.asarray([self._global_mean])
+
+    def _identity_result(self, data):
+        """Labels and cluster centers of ``k`` equal to the number of observations,
+        where each observation forms its own cluster."""
+        if self._backend == "cuML":
+            import cupy as cp
+
+            return cp.arange(len(data)), data.copy()
+
+        return np.arange(len(data)), np.asarray(data).copy()
 
     def _gmm_sklearn(self, data, **kwargs):
         """Use sklearn.mixture.GaussianMixture."""
         try:
-            from scipy.stats import multivariate_normal
-            from sklearn.mixture import GaussianMixture
+            import sklearn.mixture  # noqa: F401
+            from joblib import Parallel, delayed
         except ImportError as e:
             raise ImportError(
                 "scikit-learn and scipy are required to use `sklearn` "
                 "backend and `gmm`."
             ) from e
 
-        if isinstance(data, pd.DataFrame):
-            data = data.values
+        n_jobs = self.kwargs.get("n_jobs", -1)
 
-        self.labels = pd.DataFrame()
+        labels_arr = np.empty((len(data), len(self.k_range)), dtype=np.int32)
         self.cluster_centers = {}
 
         if self.store_bic:
             self.bic = pd.Series(dtype=float)
 
-        for n in self.k_range:
+        results = Parallel(n_jobs=n_jobs, backend="loky")(
+            delayed(_fit_one_gmm)(n, data, self._clean_kwargs, kwargs, self.store_bic)
+            for n in self.k_range
+        )
+
+        for idx, (n, labels, centers, bic, elapsed) in enumerate(results):
+            if self.store_bic:
+                self.bic.loc[n] = bic
+
+            labels_arr[:, idx] = labels
+            self.cluster_centers[n] = centers
+
+            logger.info("K=%d fitted in %.3f seconds.", n, elapsed)
+
+        self.labels = pd.DataFrame(labels_arr, columns=list(self.k_range), copy=False)
+
+    def _gmm_cuml(self, data, **kwargs):
+        """Use GaussianMixture with cluster centers and labels computed on GPU.
+
+        ``cuml.mixture.GaussianMixture`` is used if available, otherwise the model
+        is fitted with ``sklearn.mixture.GaussianMixture`` on a CPU copy of data.
+        """
+        try:
+            import cudf
+            import cupy as cp
+        except ImportError as e:
+            raise ImportError(
+                "cuML, cuDF and cupy packages are required to use `cuML` backend."
+            ) from e
+        try:
+            from cuml.mixture import GaussianMixture
+
+            fit_on_gpu = True
+        except ImportError:
+            try:
+                from sklearn.mixture import GaussianMixture
+            except ImportError as e:
+                raise ImportError(
+                    "scikit-learn is required to use `gmm` with `cuML` backend "
+                    "unless `cuml.mixture` is available."
+                ) from e
+
+            fit_on_gpu = False
+
+        data_gpu = data.values if isinstance(data, cudf.DataFrame) else cp.asarray(data)
+        data_fit = data if fit_on_gpu else cp.asnumpy(data_gpu)
+
+        labels_arr = cp.empty((len(data), len(self.k_range)), dtype=cp.int32)
+        self.cluster_centers = {}
+
+        if self.store_bic:
+            self.bic = pd.Series(dtype=float)
+
+        for idx, n in enumerate(self.k_range):
             s = time()
-            clean_kwargs = self.kwargs.copy()
-            clean_kwargs.pop("bic", None)
-            results = GaussianMixture(n_components=n, **clean_kwargs).fit(
-                data, **kwargs
+            results = GaussianMixture(n_components=n, **self._clean_kwargs).fit(
+                data_fit, **kwargs
             )
-            centers = np.empty(shape=(results.n_components, data.shape[1]))
-            for i in range(results.n_components):
-                density = multivariate_normal(
-                    cov=results.covariances_[i],
-                    mean=results.means_[i],
-                    allow_singular=True,
-                ).logpdf(data)
-                centers[i, :] = data[np.argmax(density)]
+            means = cp.asarray(results.means_)
+            covs = _full_covariances(results)
+            if not isinstance(covs, np.ndarray):
+                covs = cp.asnumpy(covs)
+            cov_inv = cp.asarray(np.linalg.pinv(covs, hermitian=True))
+
+            z = data_gpu[None, :, :] - means[:, None, :]
+            logp = -0.5 * cp.einsum("knd,kde,kne->kn", z, cov_inv, z)
+            centers = data_gpu[cp.argmax(logp, axis=1)]
 
             if self.store_bic:
-                self.bic.loc[n] = results.bic(data)
+                self.bic.loc[n] = float(results.bic(data_fit))
+
+            # labels are the components with the highest weighted log-density
+            log_dets = cp.asarray(np.linalg.slogdet(covs)[1])
+            log_weights = cp.log(cp.asarray(results.weights_))
+            logp += log_weights[:, None] - 0.5 * log_dets[:, None]
+            labels_arr[:, idx] = cp.argmax(logp, axis=0)
+            self.cluster_centers[n] = (
+                cudf.DataFrame(centers) if isinstance(data, cudf.DataFrame) else centers
+            )
 
-            self.labels[n] = results.predict(data)
-            self.cluster_centers[n] = centers
+            logger.info("K=%d fitted in %.3f seconds.", n, time() - s)
 
-            print(
-                f"K={n} fitted in {(time() - s):.3f} seconds."
-            ) if self.verbose else None
+        self.labels = cudf.DataFrame(labels_arr, columns=list(self.k_range))
 
     def _scipy_hierarchical(self, data):
         """Use scipy.cluster.hierarchy.linkage."""
@@ -347,25 +560,16 @@ class Clustergram:
         except ImportError as e:
             raise ImportError("scipy is required to use `scipy` backend.") from e
 
-        method = self.kwargs.pop("linkage", "single")
-        self.linkage = hierarchy.linkage(data, method=method, **self.kwargs)
-        rootnode, nodelist = hierarchy.to_tree(self.linkage, rd=True)
-        distances = [node.dist for node in nodelist if node.dist > 0][::-1]
-
-        self.labels = pd.DataFrame()
-        self.cluster_centers = {}
+        linkage_kwargs = self._clean_kwargs.copy()
+        method = linkage_kwargs.pop("linkage", "single")
+        self.linkage = hierarchy.linkage(data, method=method, **linkage_kwargs)
+        distances = self.linkage[self.linkage[:, 2] > 0, 2][::-1]
 
         if self.k_range is None:
             self.k_range = range(1, len(distances) + 1)
 
-        if not isinstance(data, pd.DataFrame):
-            data = pd.DataFrame(data)
-
-        for i in self.k_range:
-            d = distances[i - 1]
-            lab = hierarchy.fcluster(self.linkage, d, criterion="distance")
-            self.labels[i] = lab - 1
-            self.cluster_centers[i] = data.groupby(lab).mean().values
+        labels, self.cluster_centers = _cut_linkage(self.linkage, data, self.k_range)
+        self.labels = pd.DataFrame(labels, columns=list(self.k_range))
 
     @classmethod
     def from_centers(cls, cluster_centers, labels, data=None):
@@ -431,9 +635,15 @@ class Clustergram:
 
         cgram._n_pca = 0
         cgram._link_pca = defaultdict(dict)
+        cgram._plot_data_range = None
+        cgram._plot_data_range_pca = {}
 
         if data is not None:
             cgram.data = data
+            cgram._X_internal = np.ascontiguousarray(
+                data.values if isinstance(data, pd.DataFrame) else data,
+                dtype=np.float64,
+            )
 
         return cgram
 
@@ -483,24 +693,34 @@ class Clustergram:
         >>> cgram.plot()
 
         """
+        if method not in ["mean", "median"]:
+            raise ValueError(f"'{method}' is not supported. Use 'mean' or 'median'.")
+
         cgram = cls(k_range=list(labels.columns), method="from_data")
 
         cgram.cluster_centers = {}
         cgram.data = data
 
-        if not isinstance(data, pd.DataFrame):
-            data = pd.DataFrame(data)
+        data_np = cgram._X_internal = np.ascontiguousarray(
+            data.values if isinstance(data, pd.DataFrame) else data, dtype=np.float64
+        )
 
-        for i in cgram.k_range:
+        labels_np = labels.to_numpy(copy=False)
+        for idx, i in enumerate(cgram.k_range):
+            # labels do not need to be 0..k-1, centers follow the sorted labels
+            _, lab = np.unique(labels_np[:, idx], return_inverse=True)
+            k = lab.max() + 1
             if method == "mean":
-                cgram.cluster_centers[i] = data.groupby(labels[i].values).mean().values
-            elif method == "median":
-                cgram.cluster_centers[i] = (
-                    data.groupby(labels[i].values).median().values
-                )
+                sums, counts = _sum_by_label(data_np, lab, k)
+                cgram.cluster_centers[i] = sums / counts[:, None]
             else:
-                raise ValueError(
-                    f"'{method}' is not supported. Use 'mean' or 'median'."
+                order = np.argsort(lab, kind="stable")
+                bounds = np.cumsum(np.bincount(lab, minlength=k))[:-1]
+                cgram.cluster_centers[i] = np.array(
+                    [
+                        np.median(group, axis=0)
+                        for group in np.split(data_np[order], bounds)
+                    ]
                 )
 
         cgram.labels = labels
@@ -510,6 +730,8 @@ class Clustergram:
 
         cgram._n_pca = 0
         cgram._link_pca = defaultdict(dict)
+        cgram._plot_data_range = None
+        cgram._plot_data_range_pca = {}
 
         return cgram
 
@@ -562,27 +784,41 @@ class Clustergram:
         Name: silhouette_score, dtype: float64
 
         """
+        import sklearn
         from sklearn import metrics
+        from sklearn.utils import check_random_state
 
         self.silhouette = pd.Series(name="silhouette_score", dtype="float64")
 
-        if self._backend in ["sklearn", "scipy"]:
-            for k in self.k_range:
-                if k > 1:
-                    self.silhouette.loc[k] = metrics.silhouette_score(
-                        self.data, self.labels[k], **kwargs
-                    )
-        else:
-            data = (
-                self.data.to_pandas()
-                if hasattr(self.data, "to_pandas")
-                else self.data.get()
-            )
-            for k in self.k_range:
-                if k > 1:
-                    self.silhouette.loc[k] = metrics.silhouette_score(
-                        data, self.labels[k].to_pandas(), **kwargs
-                    )
+        data, labels = self._scores_input()
+
+        kwargs = kwargs.copy()
+        sample_size = kwargs.pop("sample_size", None)
+        random_state = kwargs.pop("random_state", None)
+        metric = kwargs.pop("metric", "euclidean")
+
+        # the same sample is used for all k
+        indices = slice(None)
+        if sample_size is not None:
+            indices = check_random_state(random_state).permutation(data.shape[0])[
+                :sample_size
+            ]
+            data = data[indices]
+
+        # pairwise distances are computed once and shared across all k if they fit
+        # within ``working_memory`` of sklearn, otherwise computed in chunks per k
+        working_memory = sklearn.get_config()["working_memory"] * 2**20
+        if metric != "precomputed" and data.shape[0] ** 2 * 8 <= working_memory:
+            data = metrics.pairwise_distances(data, metric=metric, **kwargs)
+            metric = "precomputed"
+            kwargs = {}
+
+        labels = labels[indices]
+        for i, k in enumerate(self.k_range):
+            if k > 1:
+                self.silhouette.loc[k] = metrics.silhouette_score(
+                    data, labels[:, i], metric=metric, **kwargs
+                )
 
         return self.silhouette
 
@@ -594,7 +830,7 @@ class Clustergram:
         """
         Compute the Calinski and Harabasz score.
 
-        See the documentation of ``sklearn.metrics.calinski_harabasz_score``
+        Mirrors ``sklearn.metrics.calinski_harabasz_score``, see its documentation
         for details.
 
         Once computed, resulting Series is available as
@@ -635,30 +871,18 @@ class Clustergram:
         Name: calinski_harabasz_score, dtype: float64
 
         """
-        from sklearn import metrics
-
         self.calinski_harabasz = pd.Series(
             name="calinski_harabasz_score", dtype="float64"
         )
 
-        if self._backend in ["sklearn", "scipy"]:
-            for k in self.k_range:
-                if k > 1:
-                    self.calinski_harabasz.loc[k] = metrics.calinski_harabasz_score(
-                        self.data, self.labels[k]
-                    )
-        else:
-            data = (
-                self.data.to_pandas()
-                if hasattr(self.data, "to_pandas")
-                else self.data.get()
-            )
+        data, labels = self._scores_input()
+        centered = data - data.mean(axis=0)
+
+        for i, k in enumerate(self.k_range):
+            if k > 1:
+                score = _calinski_harabasz(centered, labels[:, i])
+                self.calinski_harabasz.loc[k] = score
 
-            for k in self.k_range:
-                if k > 1:
-                    self.calinski_harabasz.loc[k] = metrics.calinski_harabasz_score(
-                        data, self.labels[k].to_pandas()
-                    )
         return self.calinski_harabasz
 
     @property
@@ -669,7 +893,8 @@ class Clustergram:
         """
         Compute the Davies-Bouldin score.
 
-        See the documentation of ``sklearn.metrics.davies_bouldin_score`` for details.
+        Mirrors ``sklearn.metrics.davies_bouldin_score``, see its documentation for
+        details.
 
         Once computed, resulting Series is available as ``Clustergram.davies_bouldin``.
         Calling the original method will recompute the score.
@@ -708,31 +933,31 @@ class Clustergram:
         Name: davies_bouldin_score, dtype: float64
 
         """
-        from sklearn import metrics
-
         self.davies_bouldin = pd.Series(name="davies_bouldin_score", dtype="float64")
 
-        if self._backend in ["sklearn", "scipy"]:
-            for k in self.k_range:
-                if k > 1:
-                    self.davies_bouldin.loc[k] = metrics.davies_bouldin_score(
-                        self.data, self.labels[k]
-                    )
-        else:
-            data = (
-                self.data.to_pandas()
-                if hasattr(self.data, "to_pandas")
-                else self.data.get()
-            )
+        data, labels = self._scores_input()
+        centered = data - data.mean(axis=0)
 
-            for k in self.k_range:
-                if k > 1:
-                    self.davies_bouldin.loc[k] = metrics.davies_bouldin_score(
-                        data, self.labels[k].to_pandas()
-                    )
+        for i, k in enumerate(self.k_range):
+            if k > 1:
+                score = _davies_bouldin(centered, labels[:, i])
+                self.davies_bouldin.loc[k] = score
 
         return self.davies_bouldin
 
+    def _scores_input(self):
+        """Return data and labels as ``numpy.ndarray``, with a column of labels per
+        ``k`` in the order of ``k_range``."""
+        if self._backend in ["sklearn", "scipy"]:
+            return self._X_internal, self.labels.to_numpy(copy=False)
+
+        data = (
+            self.data.to_pandas().to_numpy()
+            if hasattr(self.data, "to_pandas")
+            else self.data.get()
+        )
+        return data, self.labels.values.get()
+
     @property
     def davies_bouldin_(self):
         return self.davies_bouldin
@@ -744,22 +969,53 @@ class Clustergram:
         n_pca = pca_kwargs["n_components"]
         if n_pca > self._n_pca:
             self._n_pca = n_pca
-            self.pca = PCA(**pca_kwargs).fit(self.data)
+            self.pca = PCA(**pca_kwargs).fit(self._X_internal)
 
         if self.plot_data_pca[n_pca].empty:
-            for n in self.k_range:
-                means = self.cluster_centers[n].dot(self.pca.components_[n_pca - 1])
-                self.plot_data_pca[n_pca][n] = np.take(means, self.labels[n].values)
-                self._link_pca[n_pca][n] = dict(zip(means, range(n)))
+            offsets, centers_flat, flat_labels = self._flat_centers()
+            proj = centers_flat @ self.pca.components_[n_pca - 1]
+
+            self.plot_data_pca[n_pca] = pd.DataFrame(
+                proj[flat_labels], columns=list(self.k_range)
+            )
+            for i, n in enumerate(self.k_range):
+                self._link_pca[n_pca][n] = dict(
+                    zip(proj[offsets[i] : offsets[i + 1]], range(n))
+                )
 
     def _compute_means_sklearn(self):
         """Compute cluster mean values using sklearn backend."""
         self.link = {}
 
-        for n in self.k_range:
-            means = np.mean(self.cluster_centers[n], axis=1)
-            self.plot_data[n] = np.take(means, self.labels[n].values)
-            self.link[n] = dict(zip(means, range(n)))
+        offsets, centers_flat, flat_labels = self._flat_centers()
+        means_flat = centers_flat.mean(axis=1)
+
+        self.plot_data = pd.DataFrame(
+            means_flat[flat_labels], columns=list(self.k_range)
+        )
+
+        for i, n in enumerate(self.k_range):
+            self.link[n] = dict(zip(means_flat[offsets[i] : offsets[i + 1]], range(n)))
+
+    def _flat_centers(self):
+        """Stack cluster centers of all k into a single array.
+
+        Returns
+        -------
+        offsets : numpy.ndarray
+            position of the first center of each k within ``centers_flat``, followed
+            by the total number of centers
+        centers_flat : numpy.ndarray
+            ``(sum_k, n_features)`` array of cluster centers
+        flat_labels : numpy.ndarray
+            ``(n_samples, len(k_range))`` array of labels pointing to
+            ``centers_flat``
+        """
+        offsets = np.cumsum([0] + [len(self.cluster_centers[n]) for n in self.k_range])
+        centers_flat = np.vstack([self.cluster_centers[n] for n in self.k_range])
+        labels_mat = self.labels[list(self.k_range)].to_numpy(dtype=np.int64)
+
+        return offsets, centers_flat, labels_mat + offsets[:-1]
 
     def _compute_pca_means_cuml(self, **pca_kwargs):
         """Compute PCA weighted cluster mean values using cuML backend."""
@@ -773,7 +1029,8 @@ class Clustergram:
             self.pca = PCA(**pca_kwargs).fit(self.data)
 
         if self.plot_data_pca[n_pca].empty:
-            for n in self.k_range:
+            labels = self.labels.values.get()
+            for i, n in enumerate(self.k_range):
                 means = (
                     self.cluster_centers[n].values.dot(
                         self.pca.components_.values[n_pca - 1]
@@ -781,9 +1038,7 @@ class Clustergram:
                     if isinstance(self.data, cudf.DataFrame)
                     else self.cluster_centers[n].dot(self.pca.components_[n_pca - 1])
                 )
-                self.plot_data_pca[n_pca][n] = cp.take(
-                    means, self.labels[n].values.get()
-                )
+                self.plot_data_pca[n_pca][n] = cp.take(means, labels[:, i])
                 self._link_pca[n_pca][n] = dict(zip(means.tolist(), range(n)))
 
     def _compute_means_cuml(self):
@@ -792,13 +1047,14 @@ class Clustergram:
 
         self.link = {}
 
-        for n in self.k_range:
+        labels = self.labels.values
+        for i, n in enumerate(self.k_range):
             means = self.cluster_centers[n].mean(axis=1)
             if isinstance(means, (cp.ndarray, np.ndarray)):
-                self.plot_data[n] = means.take(self.labels[n].values)
+                self.plot_data[n] = means.take(labels[:, i])
                 self.link[n] = dict(zip(means.tolist(), range(n)))
             else:
-                self.plot_data[n] = means.take(self.labels[n].values).to_numpy()
+                self.plot_data[n] = means.take(labels[:, i]).to_numpy()
                 self.link[n] = dict(zip(means.values.tolist(), range(n)))
 
     def _compute_means(self, pca_weighted, pca_kwargs):
@@ -807,12 +1063,43 @@ class Clustergram:
                 self._compute_pca_means_sklearn(**pca_kwargs)
             else:
                 self._compute_pca_means_cuml(**pca_kwargs)
+            n_pca = pca_kwargs["n_components"]
+            if n_pca not in self._plot_data_range_pca:
+                self._plot_data_range_pca[n_pca] = np.ptp(
+                    self.plot_data_pca[n_pca].to_numpy()
+                )
         else:
             if self.plot_data.empty:
                 if self._backend in ["sklearn", "scipy"]:
                     self._compute_means_sklearn()
                 else:
                     self._compute_means_cuml()
+                self._plot_data_range = np.ptp(self.plot_data.to_numpy())
+
+    def _plot_tables(
+        self,
+        means,
+        k_range,
+        pca_weighted,
+        pca_component,
+        stratify_by_k=None,
+        strata=None,
+    ):
+        """Counts of clusters and branches used for plotting, cached per option.
+
+        See ``_precompute_plot_tables``.
+        """
+        key = (
+            pca_weighted,
+            pca_component if pca_weighted else None,
+            stratify_by_k,
+            tuple(k_range),
+        )
+        if key not in self._plot_pair_cache:
+            self._plot_pair_cache[key] = _precompute_plot_tables(
+                means, k_range, strata, n_jobs=self.kwargs.get("n_jobs", -1)
+            )
+        return self._plot_pair_cache[key]
 
     def plot(
         self,
@@ -828,6 +1115,8 @@ class Clustergram:
         pca_weighted=True,
         pca_kwargs={},
         pca_component=1,
+        rasterize_threshold=5000,
+        raster_dpi=None,
     ):
         """
         Generate clustergram plot based on cluster centre mean values.
@@ -867,6 +1156,14 @@ class Clustergram:
             trying ``pca=2`` the PCA is run again as it computed only for the max
             ``pca`` requested. If you first run plot with ``pca=2``, the second with
             ``pca=1`` does not trigger the PCA computation.
+        rasterize_threshold : int (default 5000)
+            Cluster centres and branches are rasterized when the number of
+            observations is larger than ``rasterize_threshold``, while axes and labels
+            remain vector. This keeps vector outputs like PDF small and makes
+            redrawing faster. Pass ``None`` to never rasterize.
+        raster_dpi : int (default None)
+            Resolution of the figure (and hence of rasterized artists) in dots per
+            inch. If None, the resolution of the figure is not changed.
 
         Returns
         -------
@@ -884,56 +1181,74 @@ class Clustergram:
         Those are computed on the first call of each option (pca_weighted=True/False).
 
         """
-        from matplotlib.ticker import MaxNLocator
-
         pca_kwargs["n_components"] = pca_component
         self._compute_means(pca_weighted, pca_kwargs)
 
         if ax is None:
-            import matplotlib.pyplot as plt
-
             fig, ax = plt.subplots(figsize=figsize)
 
-        if cluster_style is None:
-            cluster_style = {}
-        cl_c = cluster_style.pop("color", "r")
-        cl_ec = cluster_style.pop("edgecolor", "w")
-        cl_lw = cluster_style.pop("linewidth", 2)
-        cl_zorder = cluster_style.pop("zorder", 2)
-        cluster_cmap = cluster_style.pop("cmap", cmap)
-
-        if line_style is None:
-            line_style = {}
-        l_c = line_style.pop("color", "k")
-        l_zorder = line_style.pop("zorder", 1)
-        solid_capstyle = line_style.pop("solid_capstyle", "butt")
-        line_cmap = line_style.pop("cmap", cmap)
+        if raster_dpi is not None:
+            ax.figure.set_dpi(raster_dpi)
+
+        # merge into new dicts so the styles passed by the user are not modified
+        cluster_style = {
+            "color": "r",
+            "edgecolor": "w",
+            "linewidth": 2,
+            "zorder": 2,
+            "cmap": cmap,
+            **(cluster_style or {}),
+        }
+        cl_c = cluster_style.pop("color")
+        cl_ec = cluster_style.pop("edgecolor")
+        cl_lw = cluster_style.pop("linewidth")
+        cl_zorder = cluster_style.pop("zorder")
+        cluster_cmap = cluster_style.pop("cmap")
+
+        line_style = {
+            "color": "k",
+            "zorder": 1,
+            "solid_capstyle": "butt",
+            "cmap": cmap,
+            **(line_style or {}),
+        }
+        l_c = line_style.pop("color")
+        l_zorder = line_style.pop("zorder")
+        solid_capstyle = line_style.pop("solid_capstyle")
+        line_cmap = line_style.pop("cmap")
 
         if k_range is None:
             k_range = self.k_range
 
         if pca_weighted:
-            means = self.plot_data_pca[pca_component].copy()
+            means = self.plot_data_pca[pca_component]
             ax.set_ylabel("PCA weighted mean of the clusters")
         else:
-            means = self.plot_data.copy()
+            means = self.plot_data
             ax.set_ylabel("Mean of the clusters")
 
         ax.set_xlabel("Number of clusters (k)")
 
+        # plotting works on host data, GPU results are moved once
+        labels = self.labels_
+        if self._backend == "cuML":
+            means = means.to_pandas()
+            labels = labels.to_pandas()
+
         if line_cmap is not None:
-            line_cmap = plt.get_cmap(line_cmap)
+            line_cmap = _get_cmap(line_cmap)
         if cluster_cmap is not None:
-            cluster_cmap=plt.get_cmap(cluster_cmap)
+            cluster_cmap = _get_cmap(cluster_cmap)
 
+        strata = None
         if stratify_by_k is not None:
-            means = means.assign(label_strata = self.labels_[stratify_by_k])
+            strata = labels[stratify_by_k].to_numpy()
 
             if line_cmap is None:
-                line_cmap = plt.get_cmap('cividis')
-            color_lut = {
-                ki:line_cmap(ki/(stratify_by_k-1)) for ki in range(stratify_by_k)
-            }
+                line_cmap = _get_cmap("cividis")
+            color_arr = line_cmap(
+                np.arange(stratify_by_k) / (stratify_by_k - 1)
+            ).astype(np.float32)
 
             # calculate the scale factor for linewidths in the plot
             # the user can specify "linewidth" to re-scale the size of the
@@ -942,137 +1257,143 @@ class Clustergram:
             # into space +/- the starting locations.
             # figure height (inches) times axis height (in percent of figure)
             axis_height_inches = ax.figure.bbox_inches.height * ax.get_position().height
-            axis_height_dy = means.max().max() - means.min().min()# this needs to come from means
+            axis_height_dy = (
+                self._plot_data_range_pca[pca_component]
+                if pca_weighted
+                else self._plot_data_range
+            )
             # linewidth in points * (1 inch / 72 points) * (dy / inch) = linewidth in dy
             # the scaling constant propagates through regardless
             linewidth_dy = (
-                linewidth**2 * (1/72) * (axis_height_dy/axis_height_inches)
+                linewidth**2 * (1 / 72) * (axis_height_dy / axis_height_inches)
             )
             # and, because this stratification encodes things in terms of their *area*,
             # we should square the linewidth like matplotlib does with "s" in plt.scatter()
 
+        counts_by_k, pair_counts = self._plot_tables(
+            means, k_range, pca_weighted, pca_component, stratify_by_k, strata
+        )
+        rasterize = rasterize_threshold is not None and len(means) > rasterize_threshold
+
+        points_x = []
+        points_y = []
+        points_counts = []
+        points_colors = []
+        strata_verts = []
+        strata_colors = []
         for i in k_range:
+            values, counts = counts_by_k[i]
+            points_x.append(np.full(len(values), i))
+            points_y.append(values)
+            points_counts.append(counts)
             if stratify_by_k is not None:
                 if i != stratify_by_k:
-                    weights = self.labels_.groupby([i,stratify_by_k]).count().iloc[:,0].to_frame("weight").reset_index()
-                    weights['colors'] = [np.asarray(color_lut.get(ki)) for ki in weights[stratify_by_k]]
-                    color_lut_by_label = weights.groupby(i).apply(
-                        lambda chunk: (chunk.colors * chunk.weight).sum(axis=0)/chunk.weight.sum()
-                    ).to_dict()
+                    # colors of clusters are the weighted mean of colors of strata
+                    overlaps, w = np.unique(
+                        np.column_stack([labels[i].to_numpy(), strata]),
+                        axis=0,
+                        return_counts=True,
+                    )
+                    # rows are sorted by the label so each cluster is a contiguous run
+                    colors_mat = color_arr[overlaps[:, 1]]
+                    uniq, starts = np.unique(overlaps[:, 0], return_index=True)
+                    num = np.add.reduceat(colors_mat * w[:, None], starts, axis=0)
+                    den = np.add.reduceat(w, starts)
+                    color_lut_by_label = dict(zip(uniq, num / den[:, None]))
                 else:
-                    color_lut_by_label = color_lut
-                label_lut_by_loc = dict(pd.concat((
-                    means[i].rename("locs"), self.labels_[i].rename("labels")
-                    ), axis=1).value_counts().index)
-                cl = means[i].value_counts()
-                c = [
-                    color_lut_by_label[label_lut_by_loc[cli]] for cli in cl.index
-                ]
-                cl_c = None
-            else:
-                cl = means[i].value_counts()
-                c=None
-            if self._backend in ["sklearn", "scipy"]:
-                ax.scatter(
-                    [i] * i,
-                    [cl.index],
-                    cl * ((500 / len(means)) * size),
-                    zorder=cl_zorder,
-                    color=cl_c,
-                    c=c,
-                    edgecolor=cl_ec,
-                    linewidth=cl_lw,
-                    **cluster_style,
+                    color_lut_by_label = color_arr
+                label_lut_by_loc = dict(
+                    pd.concat(
+                        (means[i].rename("locs"), labels[i].rename("labels")), axis=1
+                    )
+                    .value_counts()
+                    .index
                 )
-            else:
-                ax.scatter(
-                    [i] * i,
-                    cl.index.to_numpy(),
-                    (cl * ((500 / len(means)) * size)).to_numpy(),
-                    zorder=cl_zorder,
-                    color=cl_c,
-                    edgecolor=cl_ec,
-                    linewidth=cl_lw,
-                    **cluster_style,
+                points_colors.append(
+                    np.array([color_lut_by_label[label_lut_by_loc[v]] for v in values])
                 )
 
-            with contextlib.suppress(KeyError, ValueError):
-                if (i+1>k_range[-1]):
-                    continue
-                if stratify_by_k is None:
-                    sub = (
-                        means.groupby([i, i + 1]).count().reset_index()
-                        if self._backend in ["sklearn", "scipy"]
-                        else means.groupby([i, i + 1]).count().reset_index().to_pandas()
-                    )
-                else:
-                    # make sure that the label is either possible to look up or is included in the groupby.
-                    sub = means.groupby(
-                        [i, i+1, 'label_strata']
-                    ).count().iloc[:,0].rename('count_strata').reset_index()
-                    sub = sub.merge(
-                        sub.groupby(
-                            i
-                        ).count_strata.sum().rename('count_head'),
-                        left_on=i, right_index=True
-                    ).merge(
-                        sub.groupby(
-                            i+1
-                        ).count_strata.sum().rename('count_tail'),
-                        left_on=i+1, right_index=True
+        for (i, j), sub in pair_counts.items():
+            if stratify_by_k is None:
+                ends = sub[["head", "tail"]].to_numpy()
+                xs = np.broadcast_to([i, j], ends.shape)
+                artist = LineCollection(
+                    np.stack([xs, ends], axis=2),
+                    linewidths=sub["count"].to_numpy() * (50 / len(means)) * linewidth,
+                    colors=l_c,
+                    zorder=l_zorder,
+                    capstyle=solid_capstyle,
+                    **line_style,
+                )
+                if rasterize:
+                    artist.set_rasterized(True)
+                ax.add_collection(artist)
+            else:
+                y_head, y_tail, count_strata, count_head, count_tail = (
+                    sub[["head", "tail", "count_strata", "count_head", "count_tail"]]
+                    .to_numpy(dtype=np.float64)
+                    .T
+                )
+                lower_left, upper_left, lower_right, upper_right = _stratified_geometry(
+                    y_head,
+                    y_tail,
+                    count_head,
+                    count_tail,
+                    count_strata,
+                    linewidth_dy,
+                    len(means),
+                )
+                verts = np.stack(
+                    [
+                        np.column_stack([np.full(len(sub), i), lower_left]),
+                        np.column_stack([np.full(len(sub), j), lower_right]),
+                        np.column_stack([np.full(len(sub), j), upper_right]),
+                        np.column_stack([np.full(len(sub), i), upper_left]),
+                    ],
+                    axis=1,
+                )
+                label_strata = sub["label_strata"].to_numpy()
+                known = (label_strata >= 0) & (label_strata < stratify_by_k)
+                strata_verts.append(verts)
+                strata_colors.append(
+                    np.where(
+                        known[:, None],
+                        color_arr[np.where(known, label_strata, 0)],
+                        to_rgba(l_c),
                     )
-                last_head = last_tail = np.nan
-                head_offset = tail_offset = 0
-                for r in sub.itertuples():
-                    _, y_head, y_tail, *rest, count_tail = r
-                    if stratify_by_k is None:
-                        ax.plot(
-                            [i, i + 1],
-                            [y_head, y_tail],
-                            linewidth=count_tail * (50/len(means)) * linewidth,
-                            color=l_c,
-                            zorder=l_zorder,
-                            solid_capstyle=solid_capstyle,
-                            **line_style,
-                        )
-                    else:
-                        label_strata, count_strata, count_head = rest
-                        # fraction of head links that are this strata
-                        frac_strata_in_head = count_strata/count_head
-                        # when we change head/tail, we need to reset
-                        # the offset where parallelograms are
-                        # started/ended. For the head, this resets
-                        # the lower-left of the parallelogram; for
-                        # the tail, this is the lower right of the parallelogram
-                        head_width = (linewidth_dy * (count_head / len(means)))
-                        tail_width = (linewidth_dy * (count_tail / len(means)))
-                        if y_head != last_head:
-                            head_offset = head_width / 2
-                        if y_tail != last_tail:
-                            tail_offset = tail_width / 2
-
-                        l_ci = color_lut.get(
-                            label_strata, l_c
-                        )
-                        pgram_height = frac_strata_in_head * head_width
-                        lower_left = y_head - head_offset
-                        upper_left = y_head - head_offset + pgram_height
-                        lower_right = y_tail - tail_offset
-                        upper_right = y_tail - tail_offset + pgram_height
-                        ax.fill_between(
-                            [i, i+1],
-                            [lower_left, lower_right],
-                            [upper_left, upper_right],
-                            color=l_ci,
-                            edgecolor='none',
-                            linewidth=0
-                        )
-                        # since offset is subtracted, we need to move "up" by
-                        # decrementing the offset
-                        head_offset -= pgram_height
-                        tail_offset -= pgram_height
-                        last_head = y_head
-                        last_tail = y_tail
+                )
+
+        c = None
+        if stratify_by_k is not None:
+            # parallelograms of all k are drawn as a single collection
+            if strata_verts:
+                artist = PolyCollection(
+                    np.concatenate(strata_verts),
+                    facecolors=np.concatenate(strata_colors),
+                    edgecolors="none",
+                    linewidths=0,
+                )
+                if rasterize:
+                    artist.set_rasterized(True)
+                ax.add_collection(artist)
+            c = np.concatenate(points_colors)
+            cl_c = None
+        artist = ax.scatter(
+            np.concatenate(points_x),
+            np.concatenate(points_y),
+            np.concatenate(points_counts) * ((500 / len(means)) * size),
+            zorder=cl_zorder,
+            color=cl_c,
+            c=c,
+            edgecolor=cl_ec,
+            linewidth=cl_lw,
+            **cluster_style,
+        )
+        if rasterize:
+            artist.set_rasterized(True)
+
+        ax.autoscale_view()
+
         # restrict ticks to integer values only
         x_axis = ax.get_xaxis()
         x_axis.set_major_locator(MaxNLocator(integer=True))
@@ -1179,6 +1500,9 @@ class Clustergram:
             links = self.link
             ylabel = "Mean of the clusters"
 
+        if self._backend == "cuML":
+            means = means.to_pandas()
+
         if fig is None:
             if figsize is None:
                 figsize = (600, 500)
@@ -1189,33 +1513,50 @@ class Clustergram:
                 y_axis_label=ylabel,
             )
 
-        if cluster_style is None:
-            cluster_style = {}
-        cl_c = cluster_style.pop("color", "red")
-        cl_ec = cluster_style.pop("line_color", "white")
-        cl_lw = cluster_style.pop("line_width", 2)
-
-        if line_style is None:
-            line_style = {}
-        l_c = line_style.pop("color", "black")
-        line_cap = line_style.pop("line_cap", "round")
+        # merge into new dicts so the styles passed by the user are not modified
+        cluster_style = {
+            "color": "red",
+            "line_color": "white",
+            "line_width": 2,
+            **(cluster_style or {}),
+        }
+        cl_c = cluster_style.pop("color")
+        cl_ec = cluster_style.pop("line_color")
+        cl_lw = cluster_style.pop("line_width")
+
+        line_style = {"color": "black", "line_cap": "round", **(line_style or {})}
+        l_c = line_style.pop("color")
+        line_cap = line_style.pop("line_cap")
+
+        counts_by_k, pair_counts = self._plot_tables(
+            means, self.k_range, pca_weighted, pca_component
+        )
 
-        x = []
-        y = []
-        sizes = []
-        count = []
-        ratio = []
-        cluster_labels = []
+        n_points = sum(len(counts_by_k[i][0]) for i in self.k_range)
+        x = np.empty(n_points, dtype=np.int64)
+        y = np.empty(n_points)
+        sizes = np.empty(n_points)
+        count = np.empty(n_points, dtype=np.int64)
+        ratio = np.empty(n_points)
+        cluster_labels = np.empty(n_points, dtype=np.int64)
 
         total = len(means)
+        offset = 0
         for i in self.k_range:
-            cl = means[i].value_counts()
-            x += [i] * i
-            y += cl.index.values.tolist()
-            count += cl.values.tolist()
-            ratio += ((cl / total) * 100).values.tolist()
-            sizes += (cl * ((50 / len(means)) * size)).values.tolist()
-            cluster_labels += [links[i][x] for x in cl.index.values.tolist()]
+            values, counts = counts_by_k[i]
+            sl = slice(offset, offset + len(values))
+            x[sl] = i
+            y[sl] = values
+            count[sl] = counts
+            ratio[sl] = counts * (100 / total)
+            sizes[sl] = counts * ((50 / len(means)) * size)
+            link_values = np.fromiter(links[i].keys(), dtype=np.float64)
+            link_labels = np.fromiter(links[i].values(), dtype=np.int64)
+            order = np.argsort(link_values)
+            cluster_labels[sl] = link_labels[
+                order[np.searchsorted(link_values, values, sorter=order)]
+            ]
+            offset += len(values)
 
         source = ColumnDataSource(
             data={
@@ -1233,21 +1574,24 @@ class Clustergram:
             ("Cluster label", "@cluster_labels"),
         ]
 
-        stop = max(self.k_range)
-        for i in self.k_range:
-            if i < stop:
-                sub = means.groupby([i, i + 1]).count().reset_index()
-                if self._backend == "cuML":
-                    sub = sub.to_pandas()
-                for r in sub.itertuples():
-                    fig.line(
-                        [i, i + 1],
-                        [r[1], r[2]],
-                        line_width=r[3] * ((50 / len(means)) * line_width),
-                        line_cap=line_cap,
-                        color=l_c,
-                        **line_style,
-                    )
+        xs = []
+        ys = []
+        widths = []
+        for (i, j), sub in pair_counts.items():
+            xs += [[i, j]] * len(sub)
+            ys += sub[["head", "tail"]].to_numpy().tolist()
+            widths += (sub["count"] * ((50 / len(means)) * line_width)).tolist()
+
+        line_source = ColumnDataSource(data={"xs": xs, "ys": ys, "lw": widths})
+        fig.multi_line(
+            xs="xs",
+            ys="ys",
+            line_width="lw",
+            line_cap=line_cap,
+            color=l_c,
+            source=line_source,
+            **line_style,
+        )
 
         circle = fig.scatter(
             "x",
@@ -1311,3 +1655,566 @@ class Clustergram:
             Series of BIC for each option
         """
         return self.bic
+
+
+def _get_cmap(cmap):
+    """Get a colormap, caching the lookup of colormaps by name."""
+    if isinstance(cmap, str):
+        return _get_named_cmap(cmap)
+    return plt.get_cmap(cmap)
+
+
+@lru_cache(maxsize=8)
+def _get_named_cmap(name):
+    return plt.get_cmap(name)
+
+
+@contextlib.contextmanager
+def _verbosity(verbose):
+    """Report progress to stdout via the ``clustergram`` logger within the context
+    if ``verbose``.
+
+    The level of the logger is raised to ``INFO`` only for the duration of the
+    context and a handler is added only if logging is not configured otherwise.
+    Without ``verbose``, the logger is left untouched.
+    """
+    if not verbose:
+        yield
+        return
+
+    level = logger.level
+    handler = None
+    if logger.getEffectiveLevel() > logging.INFO:
+        logger.setLevel(logging.INFO)
+    if not logger.hasHandlers():
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    try:
+        yield
+    finally:
+        logger.setLevel(level)
+        if handler is not None:
+            logger.removeHandler(handler)
+
+
+def _fit_one_k(n, data, kwargs, minibatch, fit_kwargs):
+    """Fit (MiniBatch)KMeans with ``n`` clusters.
+
+    Defined at the module level so it can be dispatched to ``joblib`` workers.
+
+    Returns
+    -------
+    tuple
+        ``(n, labels_, cluster_centers_, elapsed)``
+    """
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+
+    s = time()
+    model = MiniBatchKMeans if minibatch else KMeans
+    results = model(n_clusters=n, **kwargs).fit(data, **fit_kwargs)
+
+    return n, results.labels_, results.cluster_centers_, time() - s
+
+
+def _cut_linkage(linkage, data, k_range):
+    """Cut the hierarchical tree encoded in ``linkage`` to each of ``k_range``
+    number of clusters.
+
+    The linkage matrix is walked bottom-up once, tracking the parent of each node.
+    Whenever the number of remaining clusters is one of ``k_range``, labels are
+    derived from the current roots and cluster centers from the sums of their
+    members.
+
+    Returns
+    -------
+    labels : numpy.ndarray
+        ``(n_samples, len(k_range))`` array of cluster labels
+    cluster_centers : dict
+        dictionary of cluster centers keyed by ``k``
+    """
+    n_samples = data.shape[0]
+    k_range = list(k_range)
+    position = {k: i for i, k in enumerate(k_range)}
+
+    labels = np.empty((n_samples, len(k_range)), dtype=np.int32)
+    cluster_centers = {}
+
+    n_nodes = 2 * n_samples - 1
+    parent = np.arange(n_nodes)
+
+    def cut(n_clusters):
+        # pointer jumping until each node points to the root of its cluster
+        root = parent
+        while True:
+            jumped = root[root]
+            if (jumped == root).all():
+                break
+            root = jumped
+        _, lab = np.unique(root[:n_samples], return_inverse=True)
+        labels[:, position[n_clusters]] = lab
+        sums, counts = _sum_by_label(data, lab, n_clusters)
+        cluster_centers[n_clusters] = sums / counts[:, None]
+
+    n_clusters = n_samples
+    if n_clusters in position:
+        cut(n_clusters)
+
+    smallest = min(k_range)
+    for step, (a, b) in enumerate(linkage[:, :2].astype(np.intp)):
+        if n_clusters <= smallest:
+            break
+        node = n_samples + step
+        parent[a] = parent[b] = node
+        n_clusters -= 1
+        if n_clusters in position:
+            cut(n_clusters)
+
+    return labels, {k: cluster_centers[k] for k in k_range}
+
+
+def _label_centroids(centered, labels):
+    """Centroids of clusters and squared distances of observations to them.
+
+    ``centered`` are data with the column means subtracted so the global centroid is
+    the origin.
+
+    Returns
+    -------
+    tuple
+        ``(labels, counts, centroids, sq_dists)`` where ``labels`` are encoded as
+        ``0..k-1``
+    """
+    _, labels = np.unique(labels, return_inverse=True)
+    n_samples = centered.shape[0]
+    n_labels = labels.max() + 1
+    if not 1 < n_labels < n_samples:
+        raise ValueError(
+            f"Number of labels is {n_labels}. Valid values are 2 to n_samples - 1 "
+            "(inclusive)"
+        )
+
+    sums, counts = _sum_by_label(centered, labels, n_labels)
+    centroids = sums / counts[:, None]
+    sq_dists = ((centered - centroids[labels]) ** 2).sum(axis=1)
+    return labels, counts, centroids, sq_dists
+
+
+def _calinski_harabasz(centered, labels):
+    """Mirrors ``sklearn.metrics.calinski_harabasz_score`` on centered data."""
+    _, counts, centroids, sq_dists = _label_centroids(centered, labels)
+    n_samples, n_labels = centered.shape[0], len(counts)
+
+    extra_disp = (counts * (centroids**2).sum(axis=1)).sum()
+    intra_disp = sq_dists.sum()
+    if intra_disp == 0.0:
+        return 1.0
+    return extra_disp * (n_samples - n_labels) / (intra_disp * (n_labels - 1.0))
+
+
+def _davies_bouldin(centered, labels):
+    """Mirrors ``sklearn.metrics.davies_bouldin_score`` on centered data."""
+    from sklearn.metrics import pairwise_distances
+
+    labels, counts, centroids, sq_dists = _label_centroids(centered, labels)
+
+    intra_dists = np.bincount(labels, weights=np.sqrt(sq_dists)) / counts
+    centroid_dists = pairwise_distances(centroids)
+    if np.allclose(intra_dists, 0) or np.allclose(centroid_dists, 0):
+        return 0.0
+
+    centroid_dists[centroid_dists == 0] = np.inf
+    combined_intra_dists = intra_dists[:, None] + intra_dists
+    return np.max(combined_intra_dists / centroid_dists, axis=1).mean()
+
+
+def _fit_fast_sweep(
+    fit_one_k, threshold, batch_size, n, data, kwargs, minibatch, fit_kwargs
+):
+    """Use ``fit_one_k`` with MiniBatchKMeans for ``n`` below ``threshold``."""
+    if n < threshold:
+        kwargs = {
+            key: value
+            for key, value in kwargs.items()
+            if key not in ["algorithm", "copy_x"]
+        }
+        kwargs.setdefault("batch_size", batch_size)
+        minibatch = True
+
+    return fit_one_k(n, data, kwargs, minibatch, fit_kwargs)
+
+
+def _hash_data(data):
+    """Hash the content of ``data`` to be used as a cache key."""
+    array = np.ascontiguousarray(data)
+    digest = hashlib.blake2b(f"{array.shape}{array.dtype}".encode())
+    digest.update(array.view(np.uint8))
+
+    return digest.hexdigest()
+
+
+def _cached_fit_one_k(data_hash, n, data, kwargs, minibatch, fit_kwargs):  # noqa: ARG001
+    """Version of ``_fit_one_k`` cached by ``joblib.Memory``.
+
+    ``data`` is ignored by the cache, which is keyed by ``data_hash`` instead to
+    avoid hashing the whole array for every ``k``.
+    """
+    return _fit_one_k(n, data, kwargs, minibatch, fit_kwargs)
+
+
+def _kmeanspp_one_more(data, centers, random_state):
+    """Sample one new seed with probability proportional to the squared distance
+    from the nearest of existing ``centers`` (k-means++ step)."""
+    from sklearn.metrics.pairwise import euclidean_distances
+
+    closest = euclidean_distances(data, centers, squared=True).min(axis=1)
+    total = closest.sum()
+    if total > 0:
+        idx = random_state.choice(len(data), p=closest / total)
+    else:
+        idx = random_state.randint(len(data))
+
+    return data[idx]
+
+
+def _fit_warm_started(
+    fit_one_k, k_range, data, kwargs, minibatch, fit_kwargs, global_mean
+):
+    """Fit (MiniBatch)KMeans for each ``k`` sequentially using ``fit_one_k``,
+    seeding each model with the centers of the previous (smaller) ``k`` and new
+    k-means++ samples.
+
+    The smallest ``k`` is fitted with the default initialisation unless
+    ``global_mean`` is given, in which case it is used as the seed.
+
+    Returns
+    -------
+    list
+        list of ``(n, labels_, cluster_centers_, elapsed)`` tuples
+    """
+    from sklearn.utils import check_random_state
+
+    random_state = check_random_state(kwargs.get("random_state"))
+    array = np.asarray(data, dtype=float)
+
+    prev_centers = None if global_mean is None else np.asarray([global_mean])
+    results = []
+    for n in sorted(k for k in k_range if 1 < k < len(data)):
+        if prev_centers is None:
+            result = fit_one_k(n, data, kwargs, minibatch, fit_kwargs)
+        else:
+            init = prev_centers
+            while init.shape[0] < n:
+                extra = _kmeanspp_one_more(array, init, random_state)
+                init = np.vstack([init, extra])
+            result = fit_one_k(
+                n, data, {**kwargs, "init": init, "n_init": 1}, minibatch, fit_kwargs
+            )
+        prev_centers = result[2]
+        results.append(result)
+
+    return results
+
+
+def _fit_one_gmm(n, data, kwargs, fit_kwargs, store_bic):
+    """Fit GaussianMixture with ``n`` components.
+
+    Cluster centers are the observations with the highest density within each
+    component. Defined at the module level so it can be dispatched to ``joblib``
+    workers.
+
+    Returns
+    -------
+    tuple
+        ``(n, labels, cluster_centers, bic, elapsed)``, where ``bic`` is ``None``
+        unless ``store_bic=True``.
+    """
+    from sklearn.mixture import GaussianMixture
+
+    s = time()
+    results = GaussianMixture(n_components=n, **kwargs).fit(data, **fit_kwargs)
+    # pseudo-inverse mirrors multivariate_normal(allow_singular=True)
+    covs_inv = np.linalg.pinv(_full_covariances(results), hermitian=True)
+    centers = data[_component_argmax(data, results.means_, covs_inv)]
+
+    bic = results.bic(data) if store_bic else None
+
+    return n, results.predict(data), centers, bic, time() - s
+
+
+def _full_covariances(gmm):
+    """Return covariances of a fitted GaussianMixture as ``(k, d, d)`` array."""
+    covs = gmm.covariances_
+    k, d = gmm.means_.shape
+    if gmm.covariance_type == "full":
+        return covs
+    if gmm.covariance_type == "tied":
+        return np.broadcast_to(covs, (k, d, d))
+    if gmm.covariance_type == "diag":
+        return np.eye(d) * covs[:, None, :]
+    return np.eye(d) * covs[:, None, None]
+
+
+def _component_argmax_numpy(data, means, covs_inv):
+    out = np.empty(means.shape[0], dtype=np.intp)
+    for i in range(means.shape[0]):
+        z = data - means[i]
+        out[i] = np.argmin(np.einsum("nj,jk,nk->n", z, covs_inv[i], z))
+    return out
+
+
+if HAS_NUMBA:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _component_argmax_numba(data, means, covs_inv):
+        n, d = data.shape
+        out = np.empty(means.shape[0], dtype=np.intp)
+        for i in prange(means.shape[0]):
+            z = np.empty(d)
+            best = np.inf
+            best_j = 0
+            for j in range(n):
+                for a in range(d):
+                    z[a] = data[j, a] - means[i, a]
+                dist = 0.0
+                for a in range(d):
+                    acc = 0.0
+                    for b in range(d):
+                        acc += covs_inv[i, a, b] * z[b]
+                    dist += z[a] * acc
+                if dist < best:
+                    best = dist
+                    best_j = j
+            out[i] = best_j
+        return out
+
+
+def _component_argmax(data, means, covs_inv):
+    """Find the index of the observation with the highest density within each
+    Gaussian component.
+
+    The normalising constant of a component is the same for all observations,
+    so the highest log-density is the shortest Mahalanobis distance from the
+    component mean. Uses ``numba`` if available.
+    """
+    data = np.ascontiguousarray(data, dtype=np.float64)
+    means = np.ascontiguousarray(means, dtype=np.float64)
+    covs_inv = np.ascontiguousarray(covs_inv, dtype=np.float64)
+    if HAS_NUMBA:
+        return _component_argmax_numba(data, means, covs_inv)
+    return _component_argmax_numpy(data, means, covs_inv)
+
+
+def _sum_by_label_numpy(data, labels, k):
+    sums = np.zeros((k, data.shape[1]))
+    np.add.at(sums, labels, data)
+    return sums, np.bincount(labels, minlength=k)
+
+
+if HAS_NUMBA:
+
+    @njit(parallel=True, cache=True)
+    def _sum_by_label_numba(data, labels, k, n_threads):
+        n, d = data.shape
+        n_chunks = max(1, min(n_threads, n))
+        chunk = (n + n_chunks - 1) // n_chunks
+        # thread-local accumulators avoid races on shared sums
+        sums_t = np.zeros((n_chunks, k, d))
+        counts_t = np.zeros((n_chunks, k), dtype=np.int64)
+        for c in prange(n_chunks):
+            for j in range(c * chunk, min((c + 1) * chunk, n)):
+                lab = labels[j]
+                counts_t[c, lab] += 1
+                for a in range(d):
+                    sums_t[c, lab, a] += data[j, a]
+
+        sums = np.zeros((k, d))
+        counts = np.zeros(k, dtype=np.int64)
+        for c in range(n_chunks):
+            sums += sums_t[c]
+            counts += counts_t[c]
+        return sums, counts
+
+
+def _sum_by_label(data, labels, k):
+    """Sum observations and count them per label.
+
+    ``labels`` have to be integers from ``0`` to ``k - 1``. Uses ``numba`` if
+    available, in which case the number of threads follows
+    ``numba.set_num_threads``.
+
+    Returns
+    -------
+    tuple
+        ``(sums, counts)`` of shapes ``(k, n_features)`` and ``(k,)``
+    """
+    data = np.ascontiguousarray(data)
+    labels = np.ascontiguousarray(labels, dtype=np.intp)
+    if HAS_NUMBA:
+        return _sum_by_label_numba(data, labels, k, get_num_threads())
+    return _sum_by_label_numpy(data, labels, k)
+
+
+def _precompute_plot_tables(means, k_range, strata=None, n_jobs=1):
+    """Count observations per cluster and per branch between ``k`` and ``k + 1``.
+
+    Branches of individual pairs of ``k`` are independent and are counted in
+    parallel threads if ``joblib`` is available.
+
+    Parameters
+    ----------
+    means : pandas.DataFrame
+        plot data with a column of cluster values per ``k``
+    k_range : iterable
+        iterable of ``k`` to be plotted
+    strata : numpy.ndarray (default None)
+        labels further splitting each branch
+    n_jobs : int (default 1)
+        number of threads used to count branches
+
+    Returns
+    -------
+    counts_by_k : dict
+        tuples of ``(values, counts)`` arrays of unique cluster values and the
+        number of observations in them, keyed by ``k``
+    pair_counts : dict
+        ``pandas.DataFrame`` of branches keyed by ``(k, k + 1)``. Columns are
+        ``head``, ``tail`` and ``count``, or ``head``, ``tail``, ``label_strata``,
+        ``count_strata``, ``count_head`` and ``count_tail`` if ``strata`` is given.
+    """
+    k_range = list(k_range)
+
+    counts_by_k = {k: _value_counts(means[k].to_numpy()) for k in k_range}
+
+    pairs = [k for k in k_range if k + 1 in means.columns and k + 1 <= k_range[-1]]
+    args = [(means[k].to_numpy(), means[k + 1].to_numpy(), strata) for k in pairs]
+    try:
+        from joblib import Parallel, delayed
+    except ImportError:
+        tables = [_pair_table(*a) for a in args]
+    else:
+        tables = Parallel(n_jobs=n_jobs, prefer="threads")(
+            delayed(_pair_table)(*a) for a in args
+        )
+
+    return counts_by_k, {(k, k + 1): table for k, table in zip(pairs, tables)}
+
+
+def _pair_table(head, tail, strata):
+    """Count observations in each branch between ``head`` and ``tail`` clusters.
+
+    Branches are sorted by ``head``, ``tail`` (and ``label_strata``).
+    """
+    if strata is None:
+        rows, counts = np.unique(
+            np.column_stack([head, tail]), axis=0, return_counts=True
+        )
+        return pd.DataFrame({"head": rows[:, 0], "tail": rows[:, 1], "count": counts})
+
+    rows, counts = np.unique(
+        np.column_stack([head, tail, strata]), axis=0, return_counts=True
+    )
+    table = pd.DataFrame(
+        {
+            "head": rows[:, 0],
+            "tail": rows[:, 1],
+            "label_strata": rows[:, 2].astype(strata.dtype),
+            "count_strata": counts,
+        }
+    )
+    for column, end in enumerate(["head", "tail"]):
+        _, inverse = np.unique(rows[:, column], return_inverse=True)
+        totals = np.bincount(inverse, weights=counts).astype(counts.dtype)
+        table[f"count_{end}"] = totals[inverse]
+
+    return table
+
+
+def _value_counts(values):
+    """Unique values of a 1-D array and their counts, sorted by count (descending).
+
+    Mirrors the order of ``pandas.Series.value_counts`` so that smaller clusters are
+    drawn on top of larger ones.
+    """
+    values, counts = np.unique(values, return_counts=True)
+    order = np.argsort(-counts, kind="stable")
+    return values[order], counts[order]
+
+
+def _stratified_geometry_numpy(
+    y_head, y_tail, count_head, count_tail, count_strata, linewidth_dy, n
+):
+    head_width = linewidth_dy * (count_head / n)
+    tail_width = linewidth_dy * (count_tail / n)
+    height = count_strata / count_head * head_width
+    # height already taken by preceding parallelograms sharing the head (tail)
+    below = np.cumsum(height) - height
+    head_start = _run_starts(y_head)
+    tail_start = _run_starts(y_tail)
+    lower_left = y_head - head_width / 2 + below - below[head_start]
+    lower_right = y_tail - tail_width / 2 + below - below[tail_start]
+    return lower_left, lower_left + height, lower_right, lower_right + height
+
+
+def _run_starts(values):
+    """Index of the first element of the run of equal consecutive values."""
+    positions = np.arange(len(values))
+    starts = np.ones(len(values), dtype=bool)
+    starts[1:] = values[1:] != values[:-1]
+    return np.maximum.accumulate(np.where(starts, positions, 0))
+
+
+if HAS_NUMBA:
+
+    @njit(cache=True)
+    def _stratified_geometry_numba(
+        y_head, y_tail, count_head, count_tail, count_strata, linewidth_dy, n
+    ):
+        m = y_head.shape[0]
+        lower_left = np.empty(m)
+        upper_left = np.empty(m)
+        lower_right = np.empty(m)
+        upper_right = np.empty(m)
+        last_head = last_tail = np.nan
+        head_offset = tail_offset = 0.0
+        for r in range(m):
+            head_width = linewidth_dy * (count_head[r] / n)
+            tail_width = linewidth_dy * (count_tail[r] / n)
+            if y_head[r] != last_head:
+                head_offset = head_width / 2
+            if y_tail[r] != last_tail:
+                tail_offset = tail_width / 2
+            height = count_strata[r] / count_head[r] * head_width
+            lower_left[r] = y_head[r] - head_offset
+            upper_left[r] = lower_left[r] + height
+            lower_right[r] = y_tail[r] - tail_offset
+            upper_right[r] = lower_right[r] + height
+            head_offset -= height
+            tail_offset -= height
+            last_head = y_head[r]
+            last_tail = y_tail[r]
+        return lower_left, upper_left, lower_right, upper_right
+
+
+def _stratified_geometry(
+    y_head, y_tail, count_head, count_tail, count_strata, linewidth_dy, n
+):
+    """Compute the corners of the parallelograms of a stratified branch.
+
+    Branches are ordered by head and tail. Parallelograms sharing the same head
+    (tail) are stacked on top of each other, starting from the bottom of the
+    head (tail), which is ``linewidth_dy * count / n`` wide. Uses ``numba`` if
+    available.
+
+    Returns
+    -------
+    tuple
+        ``(lower_left, upper_left, lower_right, upper_right)`` arrays
+    """
+    if HAS_NUMBA:
+        return _stratified_geometry_numba(
+            y_head, y_tail, count_head, count_tail, count_strata, linewidth_dy, n
+        )
+    return _stratified_geometry_numpy(
+        y_head, y_tail, count_head, count_tail, count_strata, linewidth_dy, n
+    )
@@ -1,3 +1,5 @@
+import logging
+
 import bokeh
 import numpy as np
 import pandas as pd
@@ -66,11 +68,11 @@ def test_sklearn_kmeans():
     ]
 
     ax = clustergram.plot(pca_kwargs={"random_state": random_state})
-    assert len(ax.get_children()) == 46
+    assert len(ax.get_children()) == 17
 
     assert clustergram.plot_data.empty
     ax = clustergram.plot(pca_weighted=False)
-    assert len(ax.get_children()) == 46
+    assert len(ax.get_children()) == 17
 
     assert abs(clustergram.plot_data_pca[1].mean().mean()) == pytest.approx(
         2.095277953205114, rel=1e-4
@@ -124,11 +126,11 @@ def test_sklearn_minibatchkmeans():
     ]
 
     ax = clustergram.plot(pca_kwargs={"random_state": random_state})
-    assert len(ax.get_children()) == 46 if SKLEARN_GE_130 else 45
+    assert len(ax.get_children()) == 17
 
     assert clustergram.plot_data.empty
     ax = clustergram.plot(pca_weighted=False)
-    assert len(ax.get_children()) == 46 if SKLEARN_GE_130 else 45
+    assert len(ax.get_children()) == 17
 
     assert abs(clustergram.plot_data_pca[1].mean().mean()) == pytest.approx(
         2.0974466923993482 if SKLEARN_GE_130 else 2.153978086091386, rel=1e-4
@@ -178,11 +180,11 @@ def test_sklearn_gmm():
     ]
 
     ax = clustergram.plot(pca_kwargs={"random_state": random_state})
-    assert len(ax.get_children()) == 44
+    assert len(ax.get_children()) == 17
 
     assert clustergram.plot_data.empty
     ax = clustergram.plot(pca_weighted=False)
-    assert len(ax.get_children()) == 44
+    assert len(ax.get_children()) == 17
 
     assert abs(clustergram.plot_data_pca[1].mean().mean()) == pytest.approx(
         2.153817166750229 if SKLEARN_GE_130 else 1.9629843968429452, rel=1e-4
@@ -195,6 +197,36 @@ def test_sklearn_gmm():
     assert isinstance(clustergram.cluster_centers_, dict)
 
 
+@pytest.mark.parametrize("covariance_type", ["full", "tied", "diag", "spherical"])
+def test_gmm_centers(covariance_type):
+    from scipy.stats import multivariate_normal
+    from sklearn.mixture import GaussianMixture
+
+    clustergram = Clustergram(
+        range(2, 5),
+        method="gmm",
+        random_state=random_state,
+        covariance_type=covariance_type,
+    )
+    clustergram.fit(data)
+
+    for k in range(2, 5):
+        gmm = GaussianMixture(
+            k, random_state=random_state, covariance_type=covariance_type
+        ).fit(data.values)
+        if covariance_type == "tied":
+            covs = [gmm.covariances_] * k
+        elif covariance_type == "diag":
+            covs = [np.diag(c) for c in gmm.covariances_]
+        else:
+            covs = gmm.covariances_
+        expected = [
+            data.values[np.argmax(multivariate_normal(mean, cov).logpdf(data.values))]
+            for mean, cov in zip(gmm.means_, covs)
+        ]
+        np.testing.assert_array_equal(clustergram.cluster_centers[k], expected)
+
+
 def test_bic():
     clustergram = Clustergram(
         range(1, 8),
@@ -246,6 +278,161 @@ def test_bic():
     assert hasattr(clustergram, "bic") is False
 
 
+@pytest.mark.parametrize("verbose", [True, False])
+def test_verbose(caplog, verbose):
+    clustergram = Clustergram(range(1, 4), random_state=random_state, verbose=verbose)
+    clustergram.fit(data)
+
+    messages = [record.getMessage() for record in caplog.records]
+    if verbose:
+        assert messages[0] == "K=1 skipped. Mean computed from data directly."
+        assert messages[1].startswith("K=2 fitted in")
+        assert len(messages) == 3
+    else:
+        assert messages == []
+    # the level is raised only for the duration of the fit
+    assert logging.getLogger("clustergram").level == logging.NOTSET
+
+
+@pytest.mark.parametrize("verbose", [True, False])
+def test_verbose_logger_level(caplog, verbose):
+    logger = logging.getLogger("clustergram")
+    clustergram = Clustergram(range(1, 4), random_state=random_state, verbose=verbose)
+    logger.setLevel(logging.ERROR)
+    try:
+        clustergram.fit(data)
+        assert logger.level == logging.ERROR
+    finally:
+        logger.setLevel(logging.NOTSET)
+    assert len(caplog.records) == (3 if verbose else 0)
+
+    # a level set by the application is respected
+    caplog.clear()
+    with caplog.at_level("INFO", logger="clustergram"):
+        Clustergram(range(1, 4), random_state=random_state, verbose=False).fit(data)
+    assert len(caplog.records) == 3
+
+
+def test_verbose_configured_logging(capsys, monkeypatch):
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    monkeypatch.setattr(logging.getLogger("clustergram"), "handlers", [])
+    root = logging.getLogger()
+    root.addHandler(handler)
+    try:
+        Clustergram(range(1, 4), random_state=random_state, verbose=True).fit(data)
+    finally:
+        root.removeHandler(handler)
+
+    messages = [record.getMessage() for record in records]
+    assert len(messages) == 3
+    assert len(set(messages)) == 3
+    assert "K=2 fitted in" not in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("method", ["kmeans", "minibatchkmeans", "gmm"])
+def test_n_jobs(method):
+    sequential = Clustergram(
+        range(1, 8), method=method, random_state=random_state, n_jobs=1
+    ).fit(data)
+    parallel = Clustergram(
+        range(1, 8), method=method, random_state=random_state, n_jobs=2
+    ).fit(data)
+
+    pd.testing.assert_frame_equal(sequential.labels, parallel.labels)
+    for i in range(1, 8):
+        np.testing.assert_array_equal(
+            sequential.cluster_centers[i], parallel.cluster_centers[i]
+        )
+
+
+@pytest.mark.parametrize("method", ["kmeans", "minibatchkmeans"])
+def test_warm_start(method):
+    clustergram = Clustergram(
+        range(1, 8), method=method, random_state=random_state, warm_start=True
+    )
+    clustergram.fit(data)
+
+    for i in range(1, 8):
+        assert clustergram.labels[i].nunique() == i
+        assert clustergram.cluster_centers[i].shape == (i, 2)
+    assert clustergram.labels.shape == (100, 7)
+
+    default = Clustergram(
+        range(2, 5), method=method, random_state=random_state, n_init=1
+    ).fit(data)
+    explicit_init = Clustergram(
+        range(2, 5),
+        method=method,
+        random_state=random_state,
+        n_init=1,
+        init="k-means++",
+        warm_start=True,
+    ).fit(data)
+    pd.testing.assert_frame_equal(default.labels, explicit_init.labels)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float64"])
+def test_dtype(dtype):
+    clustergram = Clustergram(
+        range(1, 8), random_state=random_state, n_init=10, dtype=dtype
+    )
+    clustergram.fit(data)
+
+    assert clustergram._X_internal.dtype == dtype
+    assert clustergram._X_internal.flags["C_CONTIGUOUS"]
+    for i in range(2, 8):
+        assert clustergram.labels[i].nunique() == i
+        assert clustergram.cluster_centers[i].dtype == dtype
+    assert clustergram.silhouette_score().shape == (6,)
+
+
+def test_fast_sweep():
+    clustergram = Clustergram(
+        range(1, 8), random_state=random_state, n_init=10, fast_sweep=True
+    )
+    clustergram.fit(data)
+
+    for i in range(1, 8):
+        assert clustergram.labels[i].nunique() == i
+    assert clustergram.labels.shape == (100, 7)
+
+    # only k < 3.5 is approximated with MiniBatchKMeans
+    default = Clustergram(range(1, 8), random_state=random_state, n_init=10)
+    default.fit(data)
+    for i in range(4, 8):
+        np.testing.assert_array_equal(
+            clustergram.cluster_centers[i], default.cluster_centers[i]
+        )
+
+
+def test_cachedir(tmp_path):
+    clustergram = Clustergram(
+        range(1, 8), random_state=random_state, n_init=10, cachedir=tmp_path
+    )
+    clustergram.fit(data)
+    assert any(tmp_path.iterdir())
+
+    cached = Clustergram(
+        range(1, 8), random_state=random_state, n_init=10, cachedir=tmp_path
+    )
+    cached.fit(data)
+    pd.testing.assert_frame_equal(clustergram.labels, cached.labels)
+    for i in range(1, 8):
+        np.testing.assert_array_equal(
+            clustergram.cluster_centers[i], cached.cluster_centers[i]
+        )
+
+    other = Clustergram(
+        range(1, 8), random_state=random_state, n_init=10, cachedir=tmp_path
+    )
+    other.fit(data * 2)
+    np.testing.assert_allclose(
+        other.cluster_centers[5].sum(), clustergram.cluster_centers[5].sum() * 2
+    )
+
+
 @pytest.mark.skipif(
     not RAPIDS,
     reason="RAPIDS not available.",
@@ -291,11 +478,11 @@ def test_cuml_kmeans():
     ]
 
     ax = clustergram.plot(pca_kwargs={"random_state": random_state})
-    assert len(ax.get_children()) == 44
+    assert len(ax.get_children()) == 17
 
     assert clustergram.plot_data.empty
     ax = clustergram.plot(pca_weighted=False)
-    assert len(ax.get_children()) == 44
+    assert len(ax.get_children()) == 17
 
     assert clustergram.plot_data_pca[1].mean().mean() == pytest.approx(
         1.3444129803913, rel=1e-3
@@ -330,11 +517,11 @@ def test_cuml_kmeans():
     ]
 
     ax = clustergram.plot(pca_kwargs={"random_state": random_state})
-    assert len(ax.get_children()) == 44
+    assert len(ax.get_children()) == 17
 
     assert clustergram.plot_data.empty
     ax = clustergram.plot(pca_weighted=False)
-    assert len(ax.get_children()) == 44
+    assert len(ax.get_children()) == 17
 
     assert clustergram.plot_data_pca[1].mean().mean() == pytest.approx(
         1.344412697695078, rel=1e-3
@@ -344,6 +531,33 @@ def test_cuml_kmeans():
     )
 
 
+@pytest.mark.skipif(
+    not RAPIDS,
+    reason="RAPIDS not available.",
+)
+def test_cuml_gmm():
+    clustergram = Clustergram(
+        range(1, 8), backend="cuML", method="gmm", random_state=random_state
+    )
+    clustergram.fit(cudf.DataFrame(device_data))
+
+    for i in range(1, 8):
+        assert clustergram.labels[i].nunique() == i
+    assert clustergram.labels.shape == (100, 7)
+
+    sklearn_gmm = Clustergram(
+        range(1, 8), backend="sklearn", method="gmm", random_state=random_state
+    ).fit(data)
+    for i in range(1, 8):
+        np.testing.assert_allclose(
+            clustergram.cluster_centers[i].to_numpy(),
+            sklearn_gmm.cluster_centers[i],
+        )
+
+    ax = clustergram.plot(pca_kwargs={"random_state": random_state})
+    assert len(ax.get_children()) == 17
+
+
 def test_hierarchical():
     clustergram = Clustergram(range(1, 8), method="hierarchical")
     clustergram.fit(data)
@@ -368,11 +582,11 @@ def test_hierarchical():
     ]
 
     ax = clustergram.plot(pca_kwargs={"random_state": random_state})
-    assert len(ax.get_children()) == 44
+    assert len(ax.get_children()) == 17
 
     assert clustergram.plot_data.empty
     ax = clustergram.plot(pca_weighted=False)
-    assert len(ax.get_children()) == 44
+    assert len(ax.get_children()) == 17
 
     assert abs(clustergram.plot_data_pca[1].mean().mean()) == pytest.approx(
         2.0952779532051142, rel=1e-4
@@ -384,6 +598,22 @@ def test_hierarchical():
     assert isinstance(clustergram.linkage_, np.ndarray)
 
 
+def test_hierarchical_cut():
+    from scipy.cluster import hierarchy
+    from sklearn.metrics import adjusted_rand_score
+
+    clustergram = Clustergram(range(1, 10), method="hierarchical", linkage="ward")
+    clustergram.fit(data)
+
+    for i in range(1, 10):
+        expected = hierarchy.fcluster(clustergram.linkage, i, criterion="maxclust")
+        assert adjusted_rand_score(expected, clustergram.labels[i]) == 1
+        np.testing.assert_allclose(
+            clustergram.cluster_centers[i],
+            data.groupby(clustergram.labels[i].values).mean().values,
+        )
+
+
 def test_hierarchical_array():
     clustergram = Clustergram(method="hierarchical", k_range=range(1, 10))
     clustergram.fit(data.values)
@@ -394,6 +624,36 @@ def test_hierarchical_array():
     assert clustergram.labels.notna().all().all()
 
 
+@pytest.mark.parametrize("method", ["kmeans", "gmm", "hierarchical"])
+def test_k_range_exceeding_observations(method):
+    small = data.iloc[:6]
+    clustergram = Clustergram(range(1, 10), method=method)
+    with pytest.warns(UserWarning, match="larger than the number of observations"):
+        clustergram.fit(small)
+
+    assert list(clustergram.k_range) == list(range(1, 7))
+    assert clustergram.labels.shape == (6, 6)
+    for i in range(1, 7):
+        assert clustergram.labels[i].nunique() == i
+    np.testing.assert_array_equal(
+        np.sort(clustergram.cluster_centers[6], axis=0), np.sort(small.values, axis=0)
+    )
+
+
+def test_k_range_refit():
+    clustergram = Clustergram(range(1, 10))
+    with pytest.warns(UserWarning, match="larger than the number of observations"):
+        clustergram.fit(data.iloc[:5])
+    assert list(clustergram.k_range) == list(range(1, 6))
+
+    clustergram.fit(data.iloc[:50])
+    assert list(clustergram.k_range) == list(range(1, 10))
+    assert clustergram.labels.shape == (50, 9)
+
+    with pytest.raises(ValueError, match="All values of 'k_range' are larger"):
+        Clustergram(k_range=[10, 11]).fit(data.iloc[:5])
+
+
 def test_errors():
     with pytest.raises(ValueError):
         Clustergram(range(1, 3), backend="nonsense").fit(data)
@@ -404,7 +664,7 @@ def test_errors():
     with pytest.raises(ValueError):
         Clustergram(range(1, 3), method="hieararchical", backend="sklearn").fit(data)
     with pytest.raises(ValueError):
-        Clustergram(range(1, 3), method="gmm", backend="cuML").fit(data)
+        Clustergram(range(1, 3), method="minibatchkmeans", backend="cuML").fit(data)
     with pytest.raises(ValueError):
         Clustergram().fit(data)
 
@@ -459,6 +719,30 @@ def test_silhouette_score():
     assert isinstance(clustergram.silhouette_, pd.Series)
 
 
+@pytest.mark.filterwarnings("ignore:Could not adhere to working_memory")
+def test_silhouette_score_options():
+    from sklearn import config_context, metrics
+
+    clustergram = Clustergram(
+        range(1, 8), backend="sklearn", random_state=random_state, n_init=10
+    )
+    clustergram.fit(data)
+    precomputed = clustergram.silhouette_score()
+
+    # pairwise distances not fitting working memory are not shared
+    with config_context(working_memory=0):
+        chunked = clustergram.silhouette_score()
+    pd.testing.assert_series_equal(precomputed, chunked)
+
+    sampled = clustergram.silhouette_score(sample_size=50, random_state=0)
+    for k in range(2, 8):
+        assert sampled[k] == pytest.approx(
+            metrics.silhouette_score(
+                data, clustergram.labels[k], sample_size=50, random_state=0
+            )
+        )
+
+
 @pytest.mark.skipif(
     not RAPIDS,
     reason="RAPIDS not available.",
@@ -715,11 +999,11 @@ def test_from_data_mean():
     clustergram = Clustergram.from_data(data, labels)
 
     ax = clustergram.plot(pca_kwargs={"random_state": random_state})
-    assert len(ax.get_children()) == 18
+    assert len(ax.get_children()) == 13
 
     assert clustergram.plot_data.empty
     ax = clustergram.plot(pca_weighted=False)
-    assert len(ax.get_children()) == 18
+    assert len(ax.get_children()) == 13
 
     assert abs(clustergram.plot_data_pca[1].mean().mean()) == pytest.approx(
         7.820673888000655, rel=1e-4
@@ -735,11 +1019,11 @@ def test_from_data_median():
     clustergram = Clustergram.from_data(data, labels, method="median")
 
     ax = clustergram.plot(pca_kwargs={"random_state": random_state})
-    assert len(ax.get_children()) == 18
+    assert len(ax.get_children()) == 13
 
     assert clustergram.plot_data.empty
     ax = clustergram.plot(pca_weighted=False)
-    assert len(ax.get_children()) == 18
+    assert len(ax.get_children()) == 13
 
     assert abs(clustergram.plot_data_pca[1].mean().mean()) == pytest.approx(
         7.958519683972767, rel=1e-4
@@ -749,6 +1033,36 @@ def test_from_data_median():
     )
 
 
+@pytest.mark.parametrize("method", ["mean", "median"])
+def test_from_data_groupby(method):
+    rng = np.random.default_rng(random_state)
+    data = rng.normal(size=(50, 3))
+    labels = pd.DataFrame({k: rng.integers(0, k, 50) + 5 for k in range(1, 6)})
+    clustergram = Clustergram.from_data(data, labels, method=method)
+
+    for k in range(1, 6):
+        expected = getattr(pd.DataFrame(data).groupby(labels[k].values), method)()
+        np.testing.assert_allclose(clustergram.cluster_centers[k], expected.values)
+
+
+@pytest.mark.parametrize("has_numba", [True, False])
+def test_from_data_sum_by_label(monkeypatch, has_numba):
+    from clustergram import clustergram as module
+
+    if has_numba and not module.HAS_NUMBA:
+        pytest.skip("numba is not installed")
+    monkeypatch.setattr(module, "HAS_NUMBA", has_numba)
+
+    rng = np.random.default_rng(random_state)
+    data = rng.normal(size=(1000, 3))
+    labels = pd.DataFrame({k: rng.integers(0, k, 1000) for k in range(1, 10)})
+    clustergram = Clustergram.from_data(data, labels)
+
+    for k in range(1, 10):
+        expected = pd.DataFrame(data).groupby(labels[k].values).mean()
+        np.testing.assert_allclose(clustergram.cluster_centers[k], expected.values)
+
+
 def test_from_data_nonsense():
     data = np.array([[-1, -1, 0, 10], [1, 1, 10, 2], [0, 0, 20, 4]])
     labels = pd.DataFrame({1: [0, 0, 0], 2: [0, 0, 1], 3: [0, 2, 1]})
@@ -781,7 +1095,7 @@ def test_from_centers():
 
     assert clustergram.plot_data.empty
     ax = clustergram.plot(pca_weighted=False)
-    assert len(ax.get_children()) == 18
+    assert len(ax.get_children()) == 13
 
     assert clustergram.plot_data.mean().mean() == pytest.approx(
         -0.1111111111111111, rel=1e-4
@@ -808,13 +1122,160 @@ def test_from_centers_data():
     clustergram = Clustergram.from_centers(centers, labels, data)
 
     ax = clustergram.plot(pca_weighted=True)
-    assert len(ax.get_children()) == 18
+    assert len(ax.get_children()) == 13
 
     assert clustergram.plot_data_pca[1].mean().mean() == pytest.approx(
         -0.15713484026367722, rel=1e-4
     )
 
 
+def test_plot_stratify_by_k():
+    from matplotlib.collections import PathCollection, PolyCollection
+
+    clustergram = Clustergram(range(1, 8), random_state=random_state, n_init=10)
+    clustergram.fit(data)
+
+    ax = clustergram.plot(stratify_by_k=3, pca_kwargs={"random_state": random_state})
+    children = ax.get_children()
+    assert sum(isinstance(c, PathCollection) for c in children) == 1
+    assert sum(isinstance(c, PolyCollection) for c in children) == 1
+
+    ax = clustergram.plot(stratify_by_k=3, pca_weighted=False)
+    children = ax.get_children()
+    assert sum(isinstance(c, PathCollection) for c in children) == 1
+    assert sum(isinstance(c, PolyCollection) for c in children) == 1
+
+
+def test_plot_cache():
+    clustergram = Clustergram(range(1, 8), random_state=random_state, n_init=10)
+    clustergram.fit(data)
+
+    clustergram.plot(pca_weighted=False)
+    clustergram.plot(pca_weighted=False, linewidth=2)
+    assert list(clustergram._plot_pair_cache) == [
+        (False, None, None, (1, 2, 3, 4, 5, 6, 7))
+    ]
+
+    clustergram.plot(stratify_by_k=3)
+    clustergram.bokeh()
+    assert len(clustergram._plot_pair_cache) == 3
+
+    clustergram.fit(data)
+    assert clustergram._plot_pair_cache == {}
+
+
+def test_plot_cluster_order():
+    from matplotlib.collections import PathCollection
+
+    labels = pd.DataFrame({1: [0] * 100, 2: [0] * 10 + [1] * 90})
+    centers = {1: np.array([[0.018]]), 2: np.array([[0.0], [0.02]])}
+    clustergram = Clustergram.from_centers(centers, labels)
+
+    # larger clusters are drawn first so they do not cover smaller ones
+    ax = clustergram.plot(pca_weighted=False)
+    scatter = next(c for c in ax.get_children() if isinstance(c, PathCollection))
+    np.testing.assert_array_almost_equal(scatter.get_sizes(), [500, 450, 50])
+    np.testing.assert_array_almost_equal(
+        scatter.get_offsets(), [[1, 0.018], [2, 0.02], [2, 0.0]]
+    )
+
+
+def test_plot_style_not_modified():
+    from matplotlib.collections import LineCollection, PathCollection
+    from matplotlib.colors import to_rgba
+
+    clustergram = Clustergram(range(1, 8), random_state=random_state, n_init=10)
+    clustergram.fit(data)
+
+    cluster_style = {"color": "b", "edgecolor": "k", "alpha": 0.5}
+    line_style = {"color": "g", "zorder": 0}
+    for _ in range(2):
+        ax = clustergram.plot(cluster_style=cluster_style, line_style=line_style)
+        children = ax.get_children()
+        scatter = next(c for c in children if isinstance(c, PathCollection))
+        lines = next(c for c in children if isinstance(c, LineCollection))
+        np.testing.assert_allclose(scatter.get_facecolor()[0], to_rgba("b", 0.5))
+        np.testing.assert_allclose(lines.get_color()[0], to_rgba("g"))
+        assert lines.get_zorder() == 0
+
+    assert cluster_style == {"color": "b", "edgecolor": "k", "alpha": 0.5}
+    assert line_style == {"color": "g", "zorder": 0}
+
+    cluster_style = {"color": "blue"}
+    line_style = {"color": "green"}
+    clustergram.bokeh(cluster_style=cluster_style, line_style=line_style)
+    assert cluster_style == {"color": "blue"}
+    assert line_style == {"color": "green"}
+
+
+def test_plot_ax_cmap():
+    import matplotlib.pyplot as plt
+
+    clustergram = Clustergram(range(1, 8), random_state=random_state, n_init=10)
+    clustergram.fit(data)
+
+    _, ax = plt.subplots()
+    result = clustergram.plot(ax=ax, cmap="viridis", pca_weighted=False)
+    assert result is ax
+
+    _, ax = plt.subplots()
+    result = clustergram.plot(ax=ax, stratify_by_k=3, pca_weighted=False)
+    assert result is ax
+
+
+def test_plot_stratify_by_k_numba(monkeypatch):
+    from matplotlib.collections import PolyCollection
+
+    from clustergram import clustergram as module
+
+    if not module.HAS_NUMBA:
+        pytest.skip("numba is not installed")
+
+    clustergram = Clustergram(range(1, 8), random_state=random_state, n_init=10)
+    clustergram.fit(data)
+
+    def vertices(ax):
+        return [
+            path.vertices
+            for c in ax.get_children()
+            if isinstance(c, PolyCollection)
+            for path in c.get_paths()
+        ]
+
+    expected = vertices(clustergram.plot(stratify_by_k=4))
+    monkeypatch.setattr(module, "HAS_NUMBA", False)
+    result = vertices(clustergram.plot(stratify_by_k=4))
+
+    assert len(result) == len(expected)
+    for r, e in zip(result, expected):
+        np.testing.assert_allclose(r, e)
+
+
+def test_plot_rasterize():
+    from matplotlib.collections import PathCollection, PolyCollection
+    from matplotlib.lines import Line2D
+
+    clustergram = Clustergram(range(1, 8), random_state=random_state, n_init=10)
+    clustergram.fit(data)
+
+    def data_artists(ax):
+        return [
+            c
+            for c in ax.get_children()
+            if isinstance(c, (Line2D, PathCollection, PolyCollection))
+        ]
+
+    ax = clustergram.plot(pca_weighted=False)
+    assert not any(c.get_rasterized() for c in data_artists(ax))
+
+    ax = clustergram.plot(pca_weighted=False, rasterize_threshold=50, raster_dpi=150)
+    assert all(c.get_rasterized() for c in data_artists(ax))
+    assert ax.figure.dpi == 150
+
+    ax = clustergram.plot(stratify_by_k=3, rasterize_threshold=50)
+    assert all(c.get_rasterized() for c in data_artists(ax))
+
+
 def test_bokeh():
     clustergram = Clustergram(
         range(1, 8), backend="sklearn", random_state=random_state, n_init=10
@@ -824,7 +1285,7 @@ def test_bokeh():
     f = clustergram.bokeh(pca_kwargs={"random_state": random_state})
     out = str(json_item(f, "clustergram"))
 
-    assert out.count("data") == 60
+    assert out.count("data") == 10
     assert "cluster_labels" in out
     assert "count" in out
     assert "ratio" in out
@@ -833,7 +1294,7 @@ def test_bokeh():
     f = clustergram.bokeh(pca_weighted=False)
     out = str(json_item(f, "clustergram"))
 
-    assert out.count("data") == 60
+    assert out.count("data") == 10
     assert "cluster_labels" in out
     assert "count" in out
     assert "ratio" in out
@@ -869,7 +1330,7 @@ def test_bokeh_cuml():
     f = clustergram.bokeh()
     out = str(json_item(f, "clustergram"))
 
-    assert out.count("data") == 56
+    assert out.count("data") == 10
     assert "cluster_labels" in out
     assert "count" in out
     assert "ratio" in out